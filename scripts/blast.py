@@ -1,9 +1,174 @@
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import sqlite3
+from contextlib import closing
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import time
-from urllib.parse import urlencode
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote_plus, urlencode
+import numpy as np
 import pandas as pd
-import xml.etree.ElementTree as ET
-from io import StringIO
+from lxml import etree
+from io import BytesIO, StringIO
+
+# URL for BLAST
+BASE_URL = 'https://blast.ncbi.nlm.nih.gov/Blast.cgi'
+
+# Status and result URLs only differ by RID, so the constant part is encoded once
+_SEARCHINFO_URL_TMPL = f"{BASE_URL}?{urlencode({'CMD': 'Get', 'FORMAT_OBJECT': 'SearchInfo'})}&RID={{rid}}"
+_RESULT_URL_TMPL = f"{BASE_URL}?{urlencode({'CMD': 'Get', 'FORMAT_TYPE': 'XML'})}&RID={{rid}}"
+
+# ------------------------
+# HTTP session
+# ------------------------
+
+# Shared session so every Put/SearchInfo/result request reuses the same
+# keep-alive connection (and TLS state) to the NCBI hosts
+_session = requests.Session()
+_session.headers.update({"Accept-Encoding": "gzip"})
+_session.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    # Retry-After is left to the polling loop, which validates and caps it
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[500, 502, 503, 504],
+                      raise_on_status=False, respect_retry_after_header=False),
+))
+
+# CMD=Put submits a new job even though it is a GET, so it must never be
+# retried automatically: a retry after a 5xx or read timeout could start a
+# duplicate search. It gets its own session with retries disabled.
+_put_session = requests.Session()
+_put_session.headers.update({"Accept-Encoding": "gzip"})
+_put_session.mount("https://", HTTPAdapter(max_retries=Retry(total=0, read=False)))
+
+# (connect, read) timeouts in seconds
+_TIMEOUT = (5, 60)
+
+# SearchInfo status fields, matched against the raw response bytes
+_STATUS_RE = re.compile(rb'Status=(WAITING|FAILED|UNKNOWN|READY)')
+_HITS_RE = re.compile(rb'ThereAreHits=yes')
+
+# Consecutive connection errors, 429 or 5xx responses tolerated while polling a BLAST job
+MAX_TRANSIENT_ERRORS = 5
+
+# ------------------------
+# Polling backoff
+# ------------------------
+
+def _backoff_delay(
+        poll_count: int,
+        poll_min: float,
+        poll_max: float,
+        base: float
+) -> float:
+    '''Seconds to wait before the next SearchInfo poll'''
+    return min(poll_max, poll_min * (base ** (poll_count - 1)))
+
+def _retry_after_delay(response, min_delay: float, max_delay: float) -> float | None:
+    '''Seconds requested by a Retry-After header, within [min_delay, max_delay], or None'''
+    retry_after = response.headers.get('Retry-After')
+    if not retry_after:
+        return None
+    try:
+        delay = float(retry_after)
+    except ValueError:
+        try:
+            retry_at = parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            return None
+        # A "-0000" zone gives a naive datetime; HTTP-dates are always UTC
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        delay = (retry_at - datetime.now(timezone.utc)).total_seconds()
+    if not math.isfinite(delay):
+        return None
+    return min(max_delay, max(min_delay, delay))
+
+# ------------------------
+# Local cache of finished BLAST jobs
+# ------------------------
+
+# NCBI keeps the results of a BLAST job for about 24 hours; cached entries
+# older than this are treated as stale by default
+RID_LIFETIME = 24 * 60 * 60
+
+class BlastCache:
+    '''SQLite cache of finished BLAST jobs (RID and XML), keyed by their parameters'''
+
+    def __init__(self, path: str = "files/blast_cache.sqlite"):
+        self.path = path
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS blast_cache "
+                "(key TEXT PRIMARY KEY, rid TEXT, xml BLOB, ts INTEGER)"
+            )
+
+    @staticmethod
+    def make_key(params: dict) -> str:
+        '''SHA-256 of the parameters, independent of their order'''
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+    def get(self, key: str, max_age: float | None = RID_LIFETIME) -> tuple[str, str] | None:
+        # Stale entries are filtered in SQL so their XML is never loaded
+        min_ts = time.time() - max_age if max_age is not None else float('-inf')
+        with closing(sqlite3.connect(self.path)) as conn:
+            row = conn.execute("SELECT rid, xml FROM blast_cache WHERE key=? AND ts>=?", (key, min_ts)).fetchone()
+        if row is None:
+            return None
+        rid, xml = row
+        return rid, xml.decode()
+
+    def put(self, key: str, rid: str, xml: str) -> None:
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO blast_cache (key, rid, xml, ts) VALUES (?, ?, ?, ?)",
+                (key, rid, xml.encode(), int(time.time())),
+            )
+
+    def put_file(self, key: str, rid: str, xml_path: str) -> None:
+        '''Store an exported XML file, copied into the BLOB in chunks rather than read into memory'''
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            cursor = conn.execute(
+                "INSERT OR REPLACE INTO blast_cache (key, rid, xml, ts) VALUES (?, ?, zeroblob(?), ?)",
+                (key, rid, os.path.getsize(xml_path), int(time.time())),
+            )
+            with conn.blobopen("blast_cache", "xml", cursor.lastrowid) as blob, open(xml_path, "rb") as f:
+                shutil.copyfileobj(f, blob)
+
+# ------------------------
+# Save BLAST XML results
+# ------------------------
+
+def _save_xml_results(
+        rid: str,
+        xml_result: str,
+        export: bool,
+        export_folder: str
+) -> str:
+    '''Write the XML to {export_folder}{rid}_results.xml when export is set, returning that path (or the XML)'''
+    if export:
+        if not export_folder.endswith("/"):
+            export_folder = f"{export_folder}/"
+        xml_path = f"{export_folder}{rid}_results.xml"
+        with open(xml_path, "w") as f:
+            f.write(xml_result)
+        print(f"Results written to {rid}_results.xml")
+        return xml_path
+    else:
+        print(f"BLAST Results not exported (Argument 'export' = False). RID: {rid}")
+        return xml_result
 
 # ------------------------
 # Run BLAST
@@ -21,12 +186,17 @@ def run_blast(
     filter_string: str = 'L',    # 'L' for Low-compositional complexity filter (like F in the old format)
     composition_stats: int = 2,  # Default for composition-based statistics (2 or 1)
     export:bool = False,
-    export_folder = "files/"
+    export_folder = "files/",
+    poll_backoff_min: float = 0.5,
+    poll_backoff_max: float = 60.0,
+    poll_backoff_base: float = 1.3,
+    cache_path: str | None = "files/blast_cache.sqlite",
+    cache_max_age: float | None = RID_LIFETIME
 ) -> tuple[str | None, str | None]:
-    '''Run BLAST through API guidelines'''
-    # Set URL for BLAST
-    BASE_URL = 'https://blast.ncbi.nlm.nih.gov/Blast.cgi'
+    '''Run BLAST through API guidelines
 
+    With `export=True` the path of the saved XML file is returned instead of the XML text.
+    '''
     # 1) Send the 'Put' request to start the BLAST job
     params_put = {
         'CMD': 'Put',
@@ -47,8 +217,20 @@ def run_blast(
     put_url = f"{BASE_URL}?{urlencode(params_put)}"
 
     try:
+        # Return a previous job with identical parameters if there is one; cached
+        # results do not follow NCBI database updates, so entries older than
+        # cache_max_age are ignored (cache_path=None always submits a new job)
+        cache = BlastCache(cache_path) if cache_path else None
+        cache_key = BlastCache.make_key(params_put)
+        if cache is not None:
+            cached = cache.get(cache_key, cache_max_age)
+            if cached is not None:
+                rid, xml_result = cached
+                print('Cached BLAST results found. RID:', rid)
+                return rid, _save_xml_results(rid, xml_result, export, export_folder)
+
         # Perform the PUT request
-        response_put = requests.get(put_url)
+        response_put = _put_session.get(put_url, timeout=_TIMEOUT)
         response_put.raise_for_status()
         text_put = response_put.text
 
@@ -57,92 +239,67 @@ def run_blast(
             rid = text_put.split('RID = ')[1].split('\n')[0].strip()
             print('RID obtained:', rid)
 
-            # 2) Poll for the job status in a loop
-            is_ready = False
-            poll_count = 0
-            last_status = ''
-
-            while not is_ready:
-                poll_count += 1
-
-                # Build the URL for status check
-                params_get = {
-                    'CMD': 'Get',
-                    'RID': rid,
-                    'FORMAT_OBJECT': 'SearchInfo',
-                }
-                get_url = f"{BASE_URL}?{urlencode(params_get)}"
-
-                response_get = requests.get(get_url)
-                response_get.raise_for_status()
-                text_get = response_get.text
+            # 2) Poll for the job status and retrieve the final XML
+            rid, xml_result = get_blast_results(
+                rid=rid,
+                export=export,
+                export_folder=export_folder,
+                poll_backoff_min=poll_backoff_min,
+                poll_backoff_max=poll_backoff_max,
+                poll_backoff_base=poll_backoff_base,
+            )
+            if cache is not None and xml_result is not None:
+                if export:
+                    # xml_result is the exported file path
+                    cache.put_file(cache_key, rid, xml_result)
+                else:
+                    cache.put(cache_key, rid, xml_result)
+            return rid, xml_result
+        else:
+            raise Exception('No RID found in the PUT response. Aborting.')
 
-                if 'Status=WAITING' in text_get:
-                    last_status = 'WAITING'
-                    print(f"({poll_count}) BLAST is still running. Waiting 15 seconds...")
-                    time.sleep(15)
+    except Exception as error:
+        print('Error:', str(error))
+        return None, None
 
-                elif 'Status=FAILED' in text_get:
-                    last_status = 'FAILED'
-                    print(f"({poll_count}) BLAST job failed.")
-                    break
+# ------------------------
+# Retrieve finished BLAST XML
+# ------------------------
 
-                elif 'Status=UNKNOWN' in text_get:
-                    last_status = 'UNKNOWN'
-                    print(f"({poll_count}) BLAST job unknown (possibly expired or invalid RID).")
-                    break
+def _fetch_xml_results(
+        rid: str,
+        export: bool,
+        export_folder: str
+) -> tuple[str, str]:
+    '''Download the XML of a READY job, streaming it to disk when exported'''
+    result_url = _RESULT_URL_TMPL.format(rid=quote_plus(rid))
 
-                elif 'Status=READY' in text_get:
-                    last_status = 'READY'
+    if export:
+        # Stream the body straight to disk instead of holding it in memory
+        if not export_folder.endswith("/"):
+            export_folder = f"{export_folder}/"
+        xml_path = f"{export_folder}{rid}_results.xml"
+        with _session.get(result_url, stream=True, timeout=_TIMEOUT) as response_result:
+            response_result.raise_for_status()
+            # Let urllib3 undo the gzip transfer encoding while copying
+            response_result.raw.decode_content = True
+            with open(xml_path, "wb") as f:
+                shutil.copyfileobj(response_result.raw, f)
 
-                    if 'ThereAreHits=yes' in text_get:
-                        print(f"({poll_count}) BLAST job is complete, and hits are found!")
-                    else:
-                        print(f"({poll_count}) BLAST job is complete, but NO hits found.")
+        print('=== BLAST XML RESULTS ===\n')
+        print(f"Results written to {rid}_results.xml")
 
-                    is_ready = True
-                    break
+        return rid, xml_path
 
-                else:
-                    last_status = 'OTHER'
-                    print(f"({poll_count}) Unexpected status. Stopping...")
-                    break
-
-            # 3) If the job completed successfully, retrieve the final XML
-            if last_status == 'READY':
-                params_result = {
-                    'CMD': 'Get',
-                    'RID': rid,
-                    'FORMAT_TYPE': 'XML',
-                }
-                result_url = f"{BASE_URL}?{urlencode(params_result)}"
-
-                response_result = requests.get(result_url)
-                response_result.raise_for_status()
-                xml_result = response_result.text
-
-                print('=== BLAST XML RESULTS ===\n')
-                #print(xml_result)
-
-                # Save to file
-                if export:
-                    if not export_folder.endswith("/"):
-                        export_folder = f"{export_folder}/"
-                    with open(f"{export_folder}{rid}_results.xml", "w") as f:
-                        f.write(xml_result)
-                    print(f"Results written to {rid}_results.xml")
-                else:
-                    print(f"BLAST Results not exported (Argument 'export' = False). RID: {rid}\n")
+    response_result = _session.get(result_url, timeout=_TIMEOUT)
+    response_result.raise_for_status()
+    xml_result = response_result.text
 
-                return rid, xml_result
-            else:
-                return None, None
-        else:
-            raise Exception('No RID found in the PUT response. Aborting.')
+    print('=== BLAST XML RESULTS ===\n')
+    #print(xml_result)
+    print(f"BLAST Results not exported (Argument 'export' = False). RID: {rid}")
 
-    except Exception as error:
-        print('Error:', str(error))
-        return None, None
+    return rid, xml_result
 
 # ------------------------
 # Get BLAST results using RID
@@ -151,180 +308,253 @@ def run_blast(
 def get_blast_results(
         rid: str,
         export:bool = False,
-        export_folder:str = "files/"
+        export_folder:str = "files/",
+        poll_backoff_min: float = 0.5,
+        poll_backoff_max: float = 60.0,
+        poll_backoff_base: float = 1.3
 ) -> tuple[str | None, str | None]:
-    '''Get BLAST results using RID'''
-    BASE_URL = 'https://blast.ncbi.nlm.nih.gov/Blast.cgi'
+    '''Get BLAST results using RID
 
-    is_ready = False
+    With `export=True` the path of the saved XML file is returned instead of the XML text.
+    '''
     poll_count = 0
-    last_status = ''
-
-    while not is_ready:
-        poll_count += 1
+    backoff_step = 0
+    transient_errors = 0
+    etag = None
 
-        params_get = {
-            'CMD': 'Get',
-            'RID': rid,
-            'FORMAT_OBJECT': 'SearchInfo',
-        }
-        get_url = f"{BASE_URL}?{urlencode(params_get)}"
-
-        response_get = requests.get(get_url)
-        response_get.raise_for_status()
-        text_get = response_get.text
+    # Build the URL for status check
+    get_url = _SEARCHINFO_URL_TMPL.format(rid=quote_plus(rid))
 
-        if 'Status=WAITING' in text_get:
-            last_status = 'WAITING'
-            print(f"({poll_count}) BLAST is still running. Waiting 15 seconds...")
-            time.sleep(15)
+    while True:
+        poll_count += 1
+        backoff_step += 1
 
-        elif 'Status=FAILED' in text_get:
-            last_status = 'FAILED'
+        try:
+            headers = {'If-None-Match': etag} if etag else None
+            response_get = _session.get(get_url, headers=headers, timeout=_TIMEOUT)
+            # A 429 or 5xx that outlived the adapter's quick retries is still transient
+            if response_get.status_code == 429 or response_get.status_code >= 500:
+                response_get.raise_for_status()
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.HTTPError) as error:
+            transient_errors += 1
+            if transient_errors > MAX_TRANSIENT_ERRORS:
+                raise
+            # Start the backoff schedule over once the connection recovers
+            backoff_step = 0
+            # Throttled or unavailable: wait as long as NCBI asks, if it says
+            delay = None
+            if error.response is not None and error.response.status_code in (429, 503):
+                delay = _retry_after_delay(error.response, poll_backoff_min, poll_backoff_max)
+            if delay is None:
+                delay = poll_backoff_min
+            print(f"({poll_count}) Transient error while polling: {error}. Retrying in {delay:.1f} seconds...")
+            time.sleep(delay)
+            continue
+        transient_errors = 0
+        if response_get.status_code == 304:
+            # Not modified: the status page is still the last WAITING one
+            status = b'WAITING'
+        else:
+            response_get.raise_for_status()
+            # Match the raw bytes once instead of decoding and scanning per status
+            content_get = response_get.content
+            match = _STATUS_RE.search(content_get)
+            status = match.group(1) if match else None
+
+        if status == b'WAITING':
+            etag = response_get.headers.get('ETag', etag)
+            delay = _retry_after_delay(response_get, poll_backoff_min, poll_backoff_max)
+            if delay is None:
+                delay = _backoff_delay(backoff_step, poll_backoff_min, poll_backoff_max, poll_backoff_base)
+            print(f"({poll_count}) BLAST is still running. Waiting {delay:.1f} seconds...")
+            time.sleep(delay)
+
+        elif status == b'FAILED':
             print(f"({poll_count}) BLAST job failed.")
-            break
+            return None, None
 
-        elif 'Status=UNKNOWN' in text_get:
-            last_status = 'UNKNOWN'
+        elif status == b'UNKNOWN':
             print(f"({poll_count}) BLAST job unknown (possibly expired or invalid RID).")
-            break
-
-        elif 'Status=READY' in text_get:
-            last_status = 'READY'
+            return None, None
 
-            if 'ThereAreHits=yes' in text_get:
+        elif status == b'READY':
+            if _HITS_RE.search(content_get):
                 print(f"({poll_count}) BLAST job is complete, and hits are found!")
             else:
                 print(f"({poll_count}) BLAST job is complete, but NO hits found.")
 
-            is_ready = True
-            break
+            # Retrieve the final XML straight away, without another status check
+            return _fetch_xml_results(rid, export, export_folder)
 
         else:
-            last_status = 'OTHER'
             print(f"({poll_count}) Unexpected status. Stopping...")
-            break
-
-    # 3) If the job completed successfully, retrieve the final XML
-    if last_status == 'READY':
-        params_result = {
-            'CMD': 'Get',
-            'RID': rid,
-            'FORMAT_TYPE': 'XML',
-        }
-        result_url = f"{BASE_URL}?{urlencode(params_result)}"
-
-        response_result = requests.get(result_url)
-        response_result.raise_for_status()
-        xml_result = response_result.text
-
-        print('=== BLAST XML RESULTS ===\n')
-        #print(xml_result)
-
-        # Save to file
-        if export:
-            if not export_folder.endswith("/"):
-                export_folder = f"{export_folder}/"
-            with open(f"{export_folder}{rid}_results.xml", "w") as f:
-                f.write(xml_result)
-            print(f"Results written to {rid}_results.xml")
-        else:
-            print(f"BLAST Results not exported (Argument 'export' = False). RID: {rid}")
-
-        return rid, xml_result
-    else:
-        return None, None
+            return None, None
 
 # ------------------------
 # Convert BLAST XML fie to DataFrame
 # ------------------------
 
+def _parse_blast_xml(xml_results: str | os.PathLike) -> pd.DataFrame:
+    '''Parse BLAST XML results (text or file path) into one row per hit'''
+    if isinstance(xml_results, os.PathLike) or os.path.exists(xml_results):
+        source = xml_results
+    else:
+        source = BytesIO(xml_results.encode())
+
+    # Extract data, one list per column
+    hit_num = []
+    hit_id = []
+    hit_def = []
+    hit_accession = []
+    hit_len = []
+    hsp_num = []
+    bit_score = []
+    score = []
+    evalue = []
+    query_from = []
+    query_to = []
+    hit_from = []
+    hit_to = []
+    identity = []
+    positive = []
+    gaps = []
+    align_len = []
+    qseq = []
+    hseq = []
+    midline = []
+
+    # Stream through each hit
+    for _, hit in etree.iterparse(source, events=('end',), tag='Hit'):
+        # Get HSP data from the first HSP; the Hit and HSP children are each
+        # read into a tag -> text dict in one pass instead of a find() per field
+        hsp = hit.find('Hit_hsps/Hsp')
+        if hsp is not None:
+            hit_fields = {child.tag: child.text for child in hit}
+            hit_num.append(hit_fields['Hit_num'])
+            hit_id.append(hit_fields['Hit_id'])
+            hit_def.append(hit_fields['Hit_def'])
+            hit_accession.append(hit_fields['Hit_accession'])
+            hit_len.append(hit_fields['Hit_len'])
+
+            fields = {child.tag: child.text for child in hsp}
+            hsp_num.append(fields['Hsp_num'])
+            bit_score.append(fields['Hsp_bit-score'])
+            score.append(fields['Hsp_score'])
+            evalue.append(fields['Hsp_evalue'])
+            query_from.append(fields['Hsp_query-from'])
+            query_to.append(fields['Hsp_query-to'])
+            hit_from.append(fields['Hsp_hit-from'])
+            hit_to.append(fields['Hsp_hit-to'])
+            identity.append(fields['Hsp_identity'])
+            positive.append(fields['Hsp_positive'])
+            gaps.append(fields['Hsp_gaps'])
+            align_len.append(fields['Hsp_align-len'])
+            qseq.append(fields['Hsp_qseq'])
+            hseq.append(fields['Hsp_hseq'])
+            midline.append(fields['Hsp_midline'])
+
+        # Free the processed hit and the already-seen siblings before it
+        hit.clear()
+        while hit.getprevious() is not None:
+            del hit.getparent()[0]
+
+    # Create DataFrame from the raw strings
+    df = pd.DataFrame({
+        'Hit_num': hit_num,
+        'Hit_id': hit_id,
+        'Hit_def': hit_def,
+        'Hit_accession': hit_accession,
+        'Hit_len': hit_len,
+        'Hsp_num': hsp_num,
+        'Bit_score': bit_score,
+        'Score': score,
+        'E_value': evalue,
+        'Query_from': query_from,
+        'Query_to': query_to,
+        'Hit_from': hit_from,
+        'Hit_to': hit_to,
+        'Identity': identity,
+        'Positive': positive,
+        'Gaps': gaps,
+        'Align_len': align_len,
+        'Query_seq': qseq,
+        'Hit_seq': hseq,
+        'Midline': midline,
+    }, copy=False)
+
+    # Convert each numeric column in a single vectorized pass to a fixed int32
+    # schema, whatever the values (E_value stays a string, as BLAST reports it)
+    for col in ['Score', 'Query_from', 'Query_to', 'Hit_from', 'Hit_to', 'Identity', 'Positive', 'Gaps', 'Align_len', 'Hit_len']:
+        df[col] = pd.to_numeric(df[col]).astype(np.int32)
+    df['Bit_score'] = df['Bit_score'].astype(np.float32)
+    percent_identity = np.round(df['Identity'].to_numpy() / df['Align_len'].to_numpy() * 100, 2)
+    df.insert(df.columns.get_loc('Align_len') + 1, 'Percent_identity', percent_identity)
+
+    return df
+
+@functools.lru_cache(maxsize=32)
+def _read_parsed_results(parquet_path: str, mtime_ns: int) -> pd.DataFrame:
+    '''Load a parsed RID from disk once per process and file version (mtime_ns)'''
+    return pd.read_parquet(parquet_path)
+
 def convert_blast_xml_to_pd(
-        xml_results:str, 
+        xml_results:str | os.PathLike, 
         rid:str,
         export:bool = False,
-        export_folder:str = "files/"
+        export_folder:str = "files/",
+        use_cache:bool = True
 ) -> pd.DataFrame:
     '''Convert BLAST XML results to Pandas DataFrame'''
-    # Parse XML
-    root = ET.fromstring(xml_results)
-
-    # Extract data
-    data = []
-
-    # Namespace for BLAST XML
-    namespace = ''
-
-    # Extract data from each hit
-    for hit in root.findall(f'.//{namespace}Hit'):
-        hit_num = hit.find(f'{namespace}Hit_num').text
-        hit_id = hit.find(f'{namespace}Hit_id').text
-        hit_def = hit.find(f'{namespace}Hit_def').text
-        hit_accession = hit.find(f'{namespace}Hit_accession').text
-        hit_len = hit.find(f'{namespace}Hit_len').text
-
-        # Get HSP data
-        hsp = hit.find(f'.//{namespace}Hsp')
-        if hsp is not None:
-            hsp_num = hsp.find(f'{namespace}Hsp_num').text
-            bit_score = hsp.find(f'{namespace}Hsp_bit-score').text
-            score = hsp.find(f'{namespace}Hsp_score').text
-            evalue = hsp.find(f'{namespace}Hsp_evalue').text
-            query_from = hsp.find(f'{namespace}Hsp_query-from').text
-            query_to = hsp.find(f'{namespace}Hsp_query-to').text
-            hit_from = hsp.find(f'{namespace}Hsp_hit-from').text
-            hit_to = hsp.find(f'{namespace}Hsp_hit-to').text
-            identity = hsp.find(f'{namespace}Hsp_identity').text
-            positive = hsp.find(f'{namespace}Hsp_positive').text
-            gaps = hsp.find(f'{namespace}Hsp_gaps').text
-            align_len = hsp.find(f'{namespace}Hsp_align-len').text
-            qseq = hsp.find(f'{namespace}Hsp_qseq').text
-            hseq = hsp.find(f'{namespace}Hsp_hseq').text
-            midline = hsp.find(f'{namespace}Hsp_midline').text
-
-            # Append to data list
-            data.append({
-                'Hit_num': hit_num,
-                'Hit_id': hit_id,
-                'Hit_def': hit_def,
-                'Hit_accession': hit_accession,
-                'Hit_len': hit_len,
-                'Hsp_num': hsp_num,
-                'Bit_score': float(bit_score),
-                'Score': int(score),
-                'E_value': evalue,
-                'Query_from': int(query_from),
-                'Query_to': int(query_to),
-                'Hit_from': int(hit_from),
-                'Hit_to': int(hit_to),
-                'Identity': int(identity),
-                'Positive': int(positive),
-                'Gaps': int(gaps),
-                'Align_len': int(align_len),
-                'Percent_identity': round(int(identity) / int(align_len) * 100, 2),
-                'Query_seq': qseq,
-                'Hit_seq': hseq,
-                'Midline': midline,
-            })
-
-    # Create DataFrame
-    df = pd.DataFrame(data)
+    if not export_folder.endswith("/"):
+        export_folder = f"{export_folder}/"
+    # Results for an RID never change, so the parsed DataFrame is kept on disk
+    parquet_path = f"{export_folder}{rid}_results.parquet"
+
+    if use_cache and os.path.exists(parquet_path):
+        # Copy so callers can modify their DataFrame without touching the cache
+        df = _read_parsed_results(parquet_path, os.stat(parquet_path).st_mtime_ns).copy()
+        print(f"Parsed results loaded from {rid}_results.parquet")
+    else:
+        df = _parse_blast_xml(xml_results)
+        if use_cache:
+            os.makedirs(export_folder, exist_ok=True)
+            df.to_parquet(parquet_path, compression='zstd', index=False)
 
     # Display the DataFrame info and first few rows
     print(f"DataFrame shape: {df.shape}")
     #print("\nFirst 5 rows:")
     #print(df.head())
 
-    # Save dataframe
-                    # Save to file
+    # Save to file
     if export:
-        if not export_folder.endswith("/"):
-            export_folder = f"{export_folder}/"
         df.to_csv(f"{export_folder}{rid}_results.csv", index=False)
         print(f"DataFrame saved to {rid}_results.csv")
 
     return df
 
+# ------------------------
+# Convert several BLAST results in parallel
+# ------------------------
+
+def convert_multiple_blast_xml_to_pd(
+        xml_results: dict[str, str | os.PathLike],
+        export:bool = False,
+        export_folder:str = "files/",
+        use_cache:bool = True,
+        max_workers: int | None = None
+) -> dict[str, pd.DataFrame]:
+    '''Convert several BLAST results, given as {rid: XML text or path}, to DataFrames'''
+    # Parsing is CPU-bound and each RID is independent, so use worker processes
+    if max_workers is None:
+        max_workers = max(1, (os.cpu_count() or 2) // 2)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            rid: executor.submit(convert_blast_xml_to_pd, xml_result, rid, export, export_folder, use_cache)
+            for rid, xml_result in xml_results.items()
+        }
+        return {rid: future.result() for rid, future in futures.items()}
+
 # ------------------------
 # Export BLAST results to FASTA file
 # ------------------------
@@ -341,22 +571,19 @@ def export_blast_results_to_fasta(
         # Create output filename
         output_filename = f"{export_folder}{rid}_blast.fasta"
 
-        # Open file for writing
+        # Get the template sequence and the hit columns as plain arrays
+        template = df['Query_seq'].iloc[0]
+        titles = df['Hit_def'].to_numpy()
+        sequences = df['Hit_seq'].to_numpy()
+
+        # Build every FASTA entry in memory, then write once
+        buffer = StringIO()
+        buffer.write(f">{query_id}\n{template}\n")
+        for title, sequence in zip(titles, sequences):
+            buffer.write(f">{title}\n{sequence}\n")
+
         with open(output_filename, 'w') as fasta_file:
-            # Get the template sequence
-            template = df['Query_seq'].iloc(0)
-            fasta_file.write(f">{query_id}\n")
-            fasta_file.write(f"{template}\n")
-
-            for index, row in df.iterrows():
-                # Get title from Hit_def column
-                title = row['Hit_def']
-                # Get sequence from Hit_seq
-                sequence = row['Hit_seq']
-
-                # Write FASTA entry directly to file
-                fasta_file.write(f">{title}\n")
-                fasta_file.write(f"{sequence}\n")
+            fasta_file.write(buffer.getvalue())
 
         print(f"BLAST results successfully exported to {output_filename}")
         print(f"Total sequences exported: {len(df)}")
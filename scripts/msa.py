@@ -1,11 +1,7 @@
-from Bio.Seq import Seq
-from Bio.SeqRecord import SeqRecord
-from Bio import SeqIO
 from Bio import AlignIO
 import os
-import random
-import string
 import subprocess
+import tempfile
 import pandas as pd
 from pymsaviz import MsaViz
 
@@ -16,91 +12,84 @@ from pymsaviz import MsaViz
 def perform_msa(
         df:pd.DataFrame,
         query_id:str,
-        num_sequences: int = 100) -> AlignIO.MultipleSeqAlignment:
-    '''Run MSA using Clustal-Omega. Make sure you have it installed (Ubuntu-based)'''
+        num_sequences: int = 100,
+        threads: int | None = None,
+        verbose: bool = False) -> AlignIO.MultipleSeqAlignment:
+    '''Run MSA using Clustal-Omega. Make sure you have it installed (Ubuntu-based)
+
+    Clustal-Omega runs with `threads` threads (all available cores by
+    default). Its progress output is only requested when `verbose` is set.
+    '''
     # Verify df is not empty
     if df.empty:
         print("Error: Input DataFrame is empty.")
         return None
 
-    # Prepare sequences
-    sequences = []
-
-    # Extract original query sequence (it's the same for all hits)
-    query_seq_str = df.iloc[0]['Query_seq']
-    query_record = SeqRecord(
-        Seq(query_seq_str),
-        id=query_id,
-        name=query_id,
-        description=f"Query Sequence: {query_id}"
-    )
+    # Prepare sequences as FASTA entries
+    entries = []
 
         # Extract top N hit sequences (Hsp_hseq)
     # Ensure num_sequences is at least 1 (for the query)
     num_hits = max(0, num_sequences - 1)
     top_hits = df.head(num_hits)
 
-    for index, row in top_hits.iterrows():
+    # Drop hits whose sequence is already present (closely related strains),
+    # keeping the first identifier; each duplicate only adds alignment time
+    unique_hits = top_hits.drop_duplicates(subset=['Hit_seq'], keep='first')
+    num_duplicates = len(top_hits) - len(unique_hits)
+    if num_duplicates:
+        print(f"Removed {num_duplicates} duplicate hit sequence(s) before alignment.")
+    top_hits = unique_hits
+
+    for hit_id, hit_accession, seq_def, hit_seq in top_hits[['Hit_id', 'Hit_accession', 'Hit_def', 'Hit_seq']].itertuples(index=False):
         # Hit_id is typically the most descriptive identifier
-        accession_parts = row['Hit_id'].split('|')
+        accession_parts = hit_id.split('|')
         # Tries to get the accession number if the ID is piped (e.g., ref|ACC|def)
-        seq_id = accession_parts[1] if len(accession_parts) > 1 else row['Hit_accession']
-        seq_def = row['Hit_def']
-
-        hit_record = SeqRecord(
-            Seq(row['Hit_seq']),
-            id=seq_id,
-            name=seq_id,
-            description=f"{seq_id} | {seq_def}"
-        )
-        sequences.append(hit_record)
-
-    if len(sequences) < 2:
-        print(f"Error: Only {len(sequences)} sequence(s) available. Need at least two sequences for alignment.")
-        return None
+        seq_id = accession_parts[1] if len(accession_parts) > 1 else hit_accession
 
-    print(f"Prepared {len(sequences)} sequences (1 Query + {len(sequences) - 1} Top Hits) for alignment.")
+        entries.append(f">{seq_id} | {seq_def}\n{hit_seq}")
 
-    # 2. Save sequences to a temporary FASTA file
-    random_suffix = ''.join(random.choices(string.ascii_letters + string.digits, k=12))
-    temp_fasta_in = f"temp_input_{random_suffix}.fasta"
-    temp_aln_out = f"temp_output_{random_suffix}.fasta"
+    if len(entries) < 2:
+        print(f"Error: Only {len(entries)} sequence(s) available. Need at least two sequences for alignment.")
+        return None
 
-    with open(temp_fasta_in, "w") as output_handle:
-        SeqIO.write(sequences, output_handle, "fasta")
-    print(f"Sequences saved to temporary file: {temp_fasta_in}")
+    print(f"Prepared {len(entries)} sequences (1 Query + {len(entries) - 1} Top Hits) for alignment.")
 
-    # 3. Run the Clustal alignment
-    try:
-        cmd = ["clustalo", "-i", temp_fasta_in, "-o", temp_aln_out, "--outfmt=fasta", "--verbose", "--auto"]
-        print(f"Running: {' '.join(cmd)}")
+    # 2. Save sequences to a temporary FASTA file, in RAM-backed /dev/shm when available
+    temp_root = '/dev/shm' if os.path.isdir('/dev/shm') else None
+    with tempfile.TemporaryDirectory(dir=temp_root) as temp_dir:
+        temp_fasta_in = os.path.join(temp_dir, "input.fasta")
+        temp_aln_out = os.path.join(temp_dir, "output.fasta")
 
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        with open(temp_fasta_in, "w") as output_handle:
+            output_handle.write("\n".join(entries) + "\n")
+        print(f"Sequences saved to temporary file: {temp_fasta_in}")
 
-        if result.returncode != 0:
-            print(f"Clustal Omega failed with error: {result.stderr}")
-            return None
+        # 3. Run the Clustal alignment
+        try:
+            if threads is None:
+                threads = os.cpu_count() or 1
+            cmd = ["clustalo", "-i", temp_fasta_in, "-o", temp_aln_out, "--outfmt=fasta", "--threads", str(threads), "--force", "--auto"]
+            if verbose:
+                cmd.append("--verbose")
+            print(f"Running: {' '.join(cmd)}")
 
-        print("Alignment completed successfully")
+            result = subprocess.run(cmd, capture_output=True, text=True)
 
-        # 4. Read the alignment
-        alignment = AlignIO.read(temp_aln_out, "fasta")
+            if result.returncode != 0:
+                print(f"Clustal Omega failed with error: {result.stderr}")
+                return None
 
-        # 5. Clean up temporary files
-        os.remove(temp_fasta_in)
-        os.remove(temp_aln_out)
-        print("Temporary files cleaned up.")
+            print("Alignment completed successfully")
 
-        return alignment
+            # 4. Read the alignment (the temporary directory is removed on exit)
+            alignment = AlignIO.read(temp_aln_out, "fasta")
 
-    except Exception as e:
-        print(f"Error during alignment: {e}")
-        # Clean up on error
-        if os.path.exists(temp_fasta_in):
-            os.remove(temp_fasta_in)
-        if os.path.exists(temp_aln_out):
-            os.remove(temp_aln_out)
-        return None
+            return alignment
+
+        except Exception as e:
+            print(f"Error during alignment: {e}")
+            return None
 
 # ------------------------
 # Testing functions
@@ -1,26 +1,71 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import math
+import os
+import aiohttp
+from aiolimiter import AsyncLimiter
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from urllib.parse import urlencode
 import xml.etree.ElementTree as ET
-import time
+
+# ------------------------
+# HTTP session
+# ------------------------
+
+# Shared session so every ESearch/EFetch request reuses the same
+# keep-alive connection (and TLS state) to the E-utilities host
+_session = requests.Session()
+_session.headers.update({"Accept-Encoding": "gzip"})
+_session.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[500, 502, 503, 504], raise_on_status=False),
+))
+
+# (connect, read) timeouts in seconds
+_TIMEOUT = (5, 60)
+
+# EFetch batches in flight at once (NCBI allows 3 requests/s without an API key)
+MAX_CONCURRENT_REQUESTS = 3
+
+# Attempts per EFetch batch when NCBI throttles (429) or fails (5xx), and the
+# shortest and longest wait between them
+MAX_BATCH_ATTEMPTS = 4
+MIN_RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 60.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Records per EFetch request (NCBI recommends up to 500 per call)
+BATCH_SIZE = 500
+
+EFETCH_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
 
 # ------------------------
 # Get result ids from query
 # ------------------------
 
-def search_ncbi_proteins(query):
+def search_ncbi_proteins(query, retmax=100000):
     base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
 
+    # usehistory keeps the result set on NCBI's history server so it can be
+    # fetched by WebEnv/query_key (see get_search_history) without resending IDs;
+    # pass retmax=0 when only the history is needed, to skip the ID list
     params = {
         'db': 'protein',
         'term': query,
         'retmode': 'xml',
-        'retmax': 100000
+        'retmax': retmax,
+        'usehistory': 'y'
     }
 
     search_url = f"{base_url}?{urlencode(params)}"
 
-    response = requests.get(search_url)
+    response = _session.get(search_url, timeout=_TIMEOUT)
     response.raise_for_status()
     xml_result = response.text
 
@@ -28,20 +73,25 @@ def search_ncbi_proteins(query):
     count = root.find('Count').text
 
     print(f"Total entries found: {count}")
-    num_batches = (int(count) + 24) // 25
+    num_batches = (int(count) + BATCH_SIZE - 1) // BATCH_SIZE
     print(f"Total available pages: {num_batches}")
-    print("(25 entries per page)")
+    print(f"({BATCH_SIZE} entries per page)")
 
     return xml_result, num_batches
 
+def get_search_history(xml_result):
+    root = ET.fromstring(xml_result)
+    webenv = root.find('WebEnv').text
+    query_key = root.find('QueryKey').text
+    count = int(root.find('Count').text)
+
+    return webenv, query_key, count
+
 # ------------------------
 # Get information of query results (BATCHED version)
 # ------------------------
 
-def fetch_protein_info_batch(id_list, batch_number=1):
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
-    BATCH_SIZE = 25
-
+def _build_batch_params(id_list, batch_number):
     start_index = (batch_number - 1) * BATCH_SIZE
     end_index = batch_number * BATCH_SIZE
     batch_ids = id_list[start_index:end_index]
@@ -53,40 +103,67 @@ def fetch_protein_info_batch(id_list, batch_number=1):
         'retmode': 'xml'
     }
 
-    fetch_url = f"{base_url}?{urlencode(params)}"
+    return params
 
-    response = requests.get(fetch_url)
-    response.raise_for_status()
-    xml_content = response.text
+def _build_history_params(webenv, query_key, retstart, retmax=BATCH_SIZE):
+    params = {
+        'db': 'protein',
+        'WebEnv': webenv,
+        'query_key': query_key,
+        'retstart': retstart,
+        'retmax': retmax,
+        'retmode': 'xml'
+    }
 
+    return params
+
+def parse_gbseq_xml(xml_content):
+    # Pure function of the EFetch body (str or bytes) so it can run in a worker process
     data = []
 
     root = ET.fromstring(xml_content)
 
-    def get_text(element, tag_name):
-        el = element.find(tag_name)
-        return el.text if el is not None else None
-
     for gbseq in root.findall('.//GBSeq'):
+        # Read every child once instead of scanning the children per field
+        fields = {child.tag: child.text for child in gbseq}
+
         current_seq = {}
 
-        current_seq['definition'] = get_text(gbseq, 'GBSeq_definition')
-        current_seq['primary_accession'] = get_text(gbseq, 'GBSeq_primary-accession')
-        current_seq['organism'] = get_text(gbseq, 'GBSeq_organism')
-        current_seq['locus'] = get_text(gbseq, 'GBSeq_locus')
-        current_seq['length'] = get_text(gbseq, 'GBSeq_length')
-        current_seq['moltype'] = get_text(gbseq, 'GBSeq_moltype')
-        current_seq['topology'] = get_text(gbseq, 'GBSeq_topology')
-        current_seq['division'] = get_text(gbseq, 'GBSeq_division')
-        current_seq['update_date'] = get_text(gbseq, 'GBSeq_update-date')
-        current_seq['create_date'] = get_text(gbseq, 'GBSeq_create-date')
-        current_seq['accession_version'] = get_text(gbseq, 'GBSeq_accession-version')
-        current_seq['source'] = get_text(gbseq, 'GBSeq_source')
-        current_seq['taxonomy'] = get_text(gbseq, 'GBSeq_taxonomy')
+        current_seq['definition'] = fields.get('GBSeq_definition')
+        current_seq['primary_accession'] = fields.get('GBSeq_primary-accession')
+        current_seq['organism'] = fields.get('GBSeq_organism')
+        current_seq['locus'] = fields.get('GBSeq_locus')
+        current_seq['length'] = fields.get('GBSeq_length')
+        current_seq['moltype'] = fields.get('GBSeq_moltype')
+        current_seq['topology'] = fields.get('GBSeq_topology')
+        current_seq['division'] = fields.get('GBSeq_division')
+        current_seq['update_date'] = fields.get('GBSeq_update-date')
+        current_seq['create_date'] = fields.get('GBSeq_create-date')
+        current_seq['accession_version'] = fields.get('GBSeq_accession-version')
+        current_seq['source'] = fields.get('GBSeq_source')
+        current_seq['taxonomy'] = fields.get('GBSeq_taxonomy')
 
         data.append(current_seq)
 
-    df = pd.DataFrame(data)
+    return data
+
+def fetch_protein_info_batch(id_list, batch_number=1):
+    params = _build_batch_params(id_list, batch_number)
+
+    # POST, since a full batch of IDs is too long for a GET URL
+    response = _session.post(EFETCH_URL, data=params, timeout=_TIMEOUT)
+    response.raise_for_status()
+
+    df = pd.DataFrame(parse_gbseq_xml(response.content))
+    return df
+
+def fetch_protein_info_history(webenv, query_key, retstart, retmax=BATCH_SIZE):
+    params = _build_history_params(webenv, query_key, retstart, retmax)
+
+    response = _session.post(EFETCH_URL, data=params, timeout=_TIMEOUT)
+    response.raise_for_status()
+
+    df = pd.DataFrame(parse_gbseq_xml(response.content))
     return df
 
 # ------------------------
@@ -104,7 +181,7 @@ def fetch_single_protein_info(protein_id, export=False, export_folder='files/'):
 
     fetch_url = f"{base_url}?{urlencode(params)}"
 
-    response = requests.get(fetch_url)
+    response = _session.get(fetch_url, timeout=_TIMEOUT)
     response.raise_for_status()
 
     if export:
@@ -119,28 +196,140 @@ def fetch_single_protein_info(protein_id, export=False, export_folder='files/'):
 # Fetch all data with batching
 # ------------------------
 
-def fetch_all_protein_data(id_list, start_batch=1, end_batch=None):
-    all_data = []
-    
-    if end_batch is None:
-        end_batch = (len(id_list) + 24) // 25
-
-    for batch_num in range(start_batch, end_batch + 1):
+# Same helper as blast._retry_after_delay; the scripts are imported both as
+# a package (the notebook) and run as standalone files, so it is repeated here
+def _retry_after_delay(response, min_delay: float, max_delay: float) -> float | None:
+    '''Seconds requested by a Retry-After header, kept between `min_delay` and `max_delay`
+
+    Returns None when the header is missing or not a finite delay.
+    '''
+    retry_after = response.headers.get('Retry-After')
+    if not retry_after:
+        return None
+    try:
+        delay = float(retry_after)
+    except ValueError:
+        try:
+            retry_at = parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            return None
+        # A "-0000" zone gives a naive datetime; HTTP-dates are always UTC
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        delay = (retry_at - datetime.now(timezone.utc)).total_seconds()
+    if not math.isfinite(delay):
+        return None
+    return min(max_delay, max(min_delay, delay))
+
+async def _fetch_batch_async(session, params, batch_num, end_batch, semaphore, limiter):
+    # At most MAX_CONCURRENT_REQUESTS in flight, each request started at
+    # least 1/MAX_CONCURRENT_REQUESTS s after the previous one (NCBI's limit
+    # without an API key). Throttled (429) and 5xx responses, as well as
+    # connection errors, are retried before the batch is given up.
+    async with semaphore:
         print(f"Fetching batch {batch_num} of {end_batch}...")
+        for attempt in range(1, MAX_BATCH_ATTEMPTS + 1):
+            delay = None
+            async with limiter:
+                try:
+                    async with session.post(EFETCH_URL, data=params) as response:
+                        if response.status not in RETRY_STATUSES:
+                            response.raise_for_status()
+                            return await response.read()
+                        error = f"HTTP {response.status}"
+                        delay = _retry_after_delay(response, MIN_RETRY_DELAY, MAX_RETRY_DELAY)
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    error = str(e) or type(e).__name__
+                except Exception as e:
+                    print(f"Error fetching batch {batch_num}: {e}")
+                    return None
+
+            if attempt == MAX_BATCH_ATTEMPTS:
+                print(f"Error fetching batch {batch_num}: {error} (gave up after {attempt} attempts)")
+                return None
+            if delay is None:
+                delay = min(MAX_RETRY_DELAY, MIN_RETRY_DELAY * 2.0 ** (attempt - 1))
+            print(f"Batch {batch_num} failed ({error}). Retrying in {delay:.1f} seconds...")
+            await asyncio.sleep(delay)
+
+async def _fetch_all_protein_data_async(batch_params, end_batch):
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    # One token per 1/MAX_CONCURRENT_REQUESTS s, so requests are evenly spaced
+    # rather than AsyncLimiter(3, 1.0)'s burst of 3 followed by one every 0.33 s
+    limiter = AsyncLimiter(1, 1 / MAX_CONCURRENT_REQUESTS)
+    connector = aiohttp.TCPConnector(limit=MAX_CONCURRENT_REQUESTS)
+    timeout = aiohttp.ClientTimeout(connect=_TIMEOUT[0], sock_read=_TIMEOUT[1])
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        # gather keeps the results in batch order
+        return await asyncio.gather(*(
+            _fetch_batch_async(session, params, batch_num, end_batch, semaphore, limiter)
+            for batch_num, params in batch_params
+        ))
+
+def _run_async(coroutine):
+    # asyncio.run refuses to start inside a running loop (e.g. Jupyter),
+    # so hand the coroutine to a worker thread with its own loop there
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+def _parse_batches(xml_bodies, batch_numbers):
+    # XML parsing is CPU-bound, so spread the batches over worker processes;
+    # a single batch is parsed in-process to skip the pool start-up cost
+    batch_records = []
+    if len(xml_bodies) == 1:
         try:
-            batch_df = fetch_protein_info_batch(id_list, batch_num)
-            all_data.append(batch_df)
-            # Respectful to NCBI servers
-            time.sleep(1)
+            batch_records.append(parse_gbseq_xml(xml_bodies[0]))
         except Exception as e:
-            print(f"Error fetching batch {batch_num}: {e}")
-            continue
-    
-    if all_data:
-        return pd.concat(all_data, ignore_index=True)
+            print(f"Error parsing batch {batch_numbers[0]}: {e}")
+        return batch_records
+
+    max_workers = max(1, (os.cpu_count() or 2) // 2)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(parse_gbseq_xml, xml_body) for xml_body in xml_bodies]
+        for batch_num, future in zip(batch_numbers, futures):
+            try:
+                batch_records.append(future.result())
+            except Exception as e:
+                print(f"Error parsing batch {batch_num}: {e}")
+    return batch_records
+
+def fetch_all_protein_data(id_list=None, start_batch=1, end_batch=None, webenv=None, query_key=None, count=None):
+    # With webenv/query_key (from get_search_history) the batches are read
+    # from NCBI's history server by retstart; otherwise by slices of id_list.
+    # end_batch defaults to the last batch of id_list or of `count` records
+    use_history = webenv is not None and query_key is not None
+    if end_batch is None:
+        if count is None:
+            if id_list is None:
+                raise ValueError("end_batch or count is required when id_list is not given")
+            count = len(id_list)
+        end_batch = (count + BATCH_SIZE - 1) // BATCH_SIZE
+
+    batch_numbers = list(range(start_batch, end_batch + 1))
+    if use_history:
+        batch_params = [(batch_num, _build_history_params(webenv, query_key, (batch_num - 1) * BATCH_SIZE)) for batch_num in batch_numbers]
     else:
+        batch_params = [(batch_num, _build_batch_params(id_list, batch_num)) for batch_num in batch_numbers]
+
+    # Download every batch concurrently, then parse the bodies in parallel
+    xml_bodies = _run_async(_fetch_all_protein_data_async(batch_params, end_batch))
+    fetched = [(batch_num, xml_body) for batch_num, xml_body in zip(batch_numbers, xml_bodies) if xml_body is not None]
+    missing = [batch_num for batch_num, xml_body in zip(batch_numbers, xml_bodies) if xml_body is None]
+    if missing:
+        print(f"Warning: {len(missing)} batch(es) could not be fetched and are missing from the results: {missing}")
+    if not fetched:
         return pd.DataFrame()
 
+    batch_records = _parse_batches([xml_body for _, xml_body in fetched], [batch_num for batch_num, _ in fetched])
+    all_data = [record for records in batch_records for record in records]
+
+    return pd.DataFrame(all_data)
+
 # ------------------------
 # Test functions
 # ------------------------
@@ -148,19 +337,24 @@ def fetch_all_protein_data(id_list, start_batch=1, end_batch=None):
 if __name__ == "__main__":
     query = "Bacillus subtilis[Organism] AND dipicolinate synthase AND subunit A"
     
-    # Search NCBI
-    protein_results, num_batches = search_ncbi_proteins(query)
+    # Search NCBI (the IDs stay on NCBI's history server, so none are returned)
+    protein_results, num_batches = search_ncbi_proteins(query, retmax=0)
 
-    # Get all IDs
-    root = ET.fromstring(protein_results)
-    id_list = [id_element.text for id_element in root.findall('.//Id')]
+    # Get the result set stored on NCBI's history server
+    webenv, query_key, count = get_search_history(protein_results)
 
     # Get DataFrame for a specific batch range
     start_batch = 1
     end_batch = 3
 
     # Only fetch a few batches to start with
-    df = fetch_all_protein_data(id_list, start_batch, min(end_batch, num_batches))
+    df = fetch_all_protein_data(
+        start_batch=start_batch,
+        end_batch=min(end_batch, num_batches),
+        webenv=webenv,
+        query_key=query_key,
+        count=count
+    )
     
     if not df.empty:
         print(f"Retrieved {len(df)} protein records")